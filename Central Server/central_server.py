@@ -1,34 +1,227 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import sqlite3
-import json
+import orjson
 from datetime import datetime, timedelta
 import logging
 import os
+import sys
+import queue
+import threading
+import time
+import atexit
+import functools
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+class SmartGridFlask(Flask):
+    json_provider_class = OrjsonProvider
+
+app = SmartGridFlask(__name__)
 CORS(app)
 
+# Configuration
+DB_PATH = 'smart_grid.db'
+READ_POOL_SIZE = 4  # Idle read connections kept open between requests
+WRITE_BATCH_SIZE = 64  # Max readings committed per transaction
+WRITE_BATCH_WAIT = 0.05  # Max seconds to wait for a batch to fill up
+CITY_STATS_CACHE_SIZE = 64  # Cached (city, hours) responses
+CITY_STATS_CACHE_TTL = 30  # Seconds a cached city_stats response is served
+STATEMENT_CACHE_SIZE = 256  # Compiled statements kept per connection
+
+# Compact row encoding: efficiency_score is stored as an integer in units of
+# 1/EFFICIENCY_SCALE, and the three zone loads share one integer column as
+# ZONE_BITS-wide fixed-point fields (industrial high, residential middle,
+# commercial low) in units of 1/ZONE_SCALE
+EFFICIENCY_SCALE = 10000
+ZONE_SCALE = 100
+ZONE_BITS = 20
+ZONE_MAX = (1 << ZONE_BITS) - 1
+
+INSERT_COLUMNS = '''
+    city, timestamp, voltage, current, power_consumption,
+    temperature, humidity, is_anomaly, is_peak_hour,
+    zone_packed, per_capita_consumption, efficiency_score
+'''
+ROW_PLACEHOLDERS = '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+# Single-row statement for leftovers, and one pre-expanded to a full batch so a
+# full batch is bound and executed as one multi-row INSERT
+INSERT_SQL = f'INSERT INTO power_readings ({INSERT_COLUMNS}) VALUES {ROW_PLACEHOLDERS}'
+INSERT_BATCH_SQL = (
+    f'INSERT INTO power_readings ({INSERT_COLUMNS}) VALUES '
+    + ', '.join([ROW_PLACEHOLDERS] * WRITE_BATCH_SIZE)
+)
+CITY_STATS_SQL = '''
+    SELECT id, city, timestamp, voltage, current, power_consumption,
+           temperature, humidity, is_anomaly, is_peak_hour,
+           zone_packed, per_capita_consumption, efficiency_score
+    FROM power_readings
+    WHERE city = ? AND timestamp > ?
+    ORDER BY timestamp DESC
+'''
+
+# Connection pool: one writer serialized by _WRITE_LOCK (SQLite allows a single
+# writer at a time anyway) plus a small pool of reader connections, which WAL
+# lets run concurrently with the writer
+_WRITE_LOCK = threading.Lock()
+_writer_conn = None
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+
+def _connect():
+    """Open a connection usable from any Flask worker thread"""
+    # sqlite3 keeps compiled statements in a per-connection LRU keyed by SQL text;
+    # since connections are pooled and every statement is a module constant, each
+    # one is compiled once per connection and reused from then on
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    return conn
+
+def _get_writer():
+    """Return the shared writer connection; callers must hold _WRITE_LOCK"""
+    global _writer_conn
+    if _writer_conn is None:
+        _writer_conn = _connect()
+    return _writer_conn
+
+def _get_conn():
+    """Borrow a read connection from the pool, opening a new one if none is idle"""
+    try:
+        return _read_pool.get_nowait()
+    except queue.Empty:
+        return _connect()
+
+def _put_conn(conn):
+    """Return a read connection to the pool"""
+    try:
+        _read_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+# Write-behind queue: store_data only enqueues the row, and a single background
+# thread commits whatever has accumulated in one transaction (one fsync per batch)
+_write_queue = queue.Queue()
+_writer_thread = None
+_writer_thread_lock = threading.Lock()
+
+def _drain_batch():
+    """Wait for a queued row, then collect up to WRITE_BATCH_SIZE within WRITE_BATCH_WAIT"""
+    batch = [_write_queue.get()]
+    deadline = time.monotonic() + WRITE_BATCH_WAIT
+    while len(batch) < WRITE_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_write_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def _write_batch(batch):
+    """Insert a batch of rows in a single transaction"""
+    with _WRITE_LOCK:
+        conn = _get_writer()
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            full = len(batch) - len(batch) % WRITE_BATCH_SIZE
+            for start in range(0, full, WRITE_BATCH_SIZE):
+                chunk = batch[start:start + WRITE_BATCH_SIZE]
+                conn.execute(INSERT_BATCH_SQL, [value for row in chunk for value in row])
+            if full < len(batch):
+                conn.executemany(INSERT_SQL, batch[full:])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _writer_loop():
+    while True:
+        batch = _drain_batch()
+        try:
+            _write_batch(batch)
+            logger.info(f"Committed {len(batch)} readings")
+        except Exception as e:
+            # Retry each row in its own transaction so one bad row only costs itself
+            logger.warning(f"Error writing batch of {len(batch)} readings, retrying row by row: {str(e)}")
+            committed = 0
+            for row in batch:
+                try:
+                    _write_batch([row])
+                    committed += 1
+                except Exception as e:
+                    logger.error(f"Dropping reading for {row[0]} at {row[1]}: {str(e)}")
+            logger.info(f"Committed {committed} of {len(batch)} readings")
+        finally:
+            for _ in batch:
+                _write_queue.task_done()
+
+def _ensure_writer_thread():
+    """Start the background writer on first use (so it is created in the serving process)"""
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_thread_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer_loop, name='db-writer', daemon=True)
+                _writer_thread.start()
+
+def flush_writes():
+    """Block until every queued reading has been committed"""
+    _write_queue.join()
+
+atexit.register(flush_writes)
+
+def _pack_zones(industrial, residential, commercial):
+    """Pack the three zone loads into one integer (see ZONE_BITS)"""
+    packed = 0
+    for value in (industrial, residential, commercial):
+        packed = (packed << ZONE_BITS) | min(max(round(value * ZONE_SCALE), 0), ZONE_MAX)
+    return packed
+
+def _unpack_zones(packed):
+    """Inverse of _pack_zones, as a zone_distribution dict"""
+    packed = packed or 0
+    return {
+        'industrial': (packed >> 2 * ZONE_BITS & ZONE_MAX) / ZONE_SCALE,
+        'residential': (packed >> ZONE_BITS & ZONE_MAX) / ZONE_SCALE,
+        'commercial': (packed & ZONE_MAX) / ZONE_SCALE
+    }
+
 # Database setup
-def init_db():
-    # Delete the existing database file if it exists
-    if os.path.exists('smart_grid.db'):
-        os.remove('smart_grid.db')
-        logger.info("Removed existing database")
+SCHEMA_VERSION = 2  # Stored in PRAGMA user_version; bump it and add a migration step to change the schema
+_init_lock = threading.Lock()
+_db_initialized = False
 
-    conn = sqlite3.connect('smart_grid.db')
-    c = conn.cursor()
-    
-    # Create the table with all required columns
+def _create_schema(c):
+    """Create the current (SCHEMA_VERSION) table and index in an empty database"""
     c.execute('''
-        CREATE TABLE IF NOT EXISTS power_readings (
+        CREATE TABLE power_readings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             city TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,  -- unix epoch milliseconds
             voltage REAL NOT NULL,
             current REAL NOT NULL,
             power_consumption REAL NOT NULL,
@@ -36,23 +229,143 @@ def init_db():
             humidity REAL,
             is_anomaly INTEGER,
             is_peak_hour INTEGER,
-            zone_industrial REAL,
-            zone_residential REAL,
-            zone_commercial REAL,
+            zone_packed INTEGER,  -- see _pack_zones
             per_capita_consumption REAL,
-            efficiency_score REAL
+            efficiency_score INTEGER  -- in units of 1/EFFICIENCY_SCALE
         )
     ''')
-    conn.commit()
-    conn.close()
-    logger.info("Created new database with updated schema")
+    
+    # Serves get_city_stats' city filter, time range and ORDER BY straight from the index
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_city_ts
+        ON power_readings(city, timestamp DESC)
+    ''')
+
+def _convert_legacy_table(c):
+    """Rebuild an unversioned table (ISO-8601 text timestamps) in the current schema"""
+    c.execute("ALTER TABLE power_readings RENAME TO power_readings_legacy")
+    _create_schema(c)
+    
+    rows = []
+    for (id_, city, timestamp, voltage, current, power_consumption, temperature, humidity,
+         is_anomaly, is_peak_hour, industrial, residential, commercial,
+         per_capita_consumption, efficiency_score) in c.execute('''
+            SELECT id, city, timestamp, voltage, current, power_consumption, temperature, humidity,
+                   is_anomaly, is_peak_hour, zone_industrial, zone_residential, zone_commercial,
+                   per_capita_consumption, efficiency_score
+            FROM power_readings_legacy
+        '''):
+        try:
+            # Parsed the same way store_data parses incoming timestamps
+            timestamp_ms = int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+        except (TypeError, ValueError):
+            raise RuntimeError(
+                f"Cannot convert legacy reading {id_} in {DB_PATH}: unparseable timestamp {timestamp!r}"
+            ) from None
+        rows.append((
+            id_, city, timestamp_ms, voltage, current, power_consumption, temperature, humidity,
+            is_anomaly, is_peak_hour,
+            _pack_zones(industrial or 0, residential or 0, commercial or 0),
+            per_capita_consumption,
+            None if efficiency_score is None else round(efficiency_score * EFFICIENCY_SCALE)
+        ))
+    
+    c.executemany('''
+        INSERT INTO power_readings (
+            id, city, timestamp, voltage, current, power_consumption, temperature, humidity,
+            is_anomaly, is_peak_hour, zone_packed, per_capita_consumption, efficiency_score
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    c.execute("DROP TABLE power_readings_legacy")
 
-# Initialize database before first request
-@app.before_first_request
-def setup():
-    init_db()
+def _migrate(c, version):
+    """Bring the schema from `version` up to SCHEMA_VERSION in place
 
-# Also initialize database when starting the server
+    A new database gets the current schema directly, and a table left by the
+    unversioned server is rebuilt in it. Upgrading an existing version 1
+    database uses ALTER TABLE ... DROP COLUMN, which needs SQLite 3.35+.
+    """
+    table_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'power_readings'"
+    ).fetchone()
+    if not table_exists:
+        _create_schema(c)
+        return
+    
+    if version < 1:
+        # Only the original unversioned server left a table behind at version 0
+        columns = {row[1]: row[2].upper() for row in c.execute("PRAGMA table_info(power_readings)")}
+        if columns.get('timestamp') != 'TEXT':
+            raise RuntimeError(
+                f"{DB_PATH} has a power_readings table with an unrecognised schema at version 0; "
+                f"move it aside to start with a new database"
+            )
+        _convert_legacy_table(c)
+        return
+    
+    if version < 2:
+        if sqlite3.sqlite_version_info < (3, 35, 0):
+            raise RuntimeError(
+                f"Upgrading the database from schema version {version} needs SQLite 3.35 or newer "
+                f"(for DROP COLUMN); this Python uses SQLite {sqlite3.sqlite_version}"
+            )
+        # Fold the zone columns into zone_packed and rescale efficiency_score to an
+        # integer; the same packing as _pack_zones, written in SQL
+        def field(column):
+            return f'max(min(CAST(round(coalesce({column}, 0) * {ZONE_SCALE}) AS INTEGER), {ZONE_MAX}), 0)'
+        c.execute("ALTER TABLE power_readings ADD COLUMN zone_packed INTEGER")
+        c.execute("ALTER TABLE power_readings ADD COLUMN efficiency_scaled INTEGER")
+        c.execute(f'''
+            UPDATE power_readings SET
+                zone_packed = ({field('zone_industrial')} << {2 * ZONE_BITS})
+                            | ({field('zone_residential')} << {ZONE_BITS})
+                            | {field('zone_commercial')},
+                efficiency_scaled = CAST(round(efficiency_score * {EFFICIENCY_SCALE}) AS INTEGER)
+        ''')
+        for column in ('zone_industrial', 'zone_residential', 'zone_commercial', 'efficiency_score'):
+            c.execute(f"ALTER TABLE power_readings DROP COLUMN {column}")
+        c.execute("ALTER TABLE power_readings RENAME COLUMN efficiency_scaled TO efficiency_score")
+
+def init_db():
+    """Create or upgrade the schema, keeping any existing readings (runs once per process)"""
+    global _db_initialized
+    with _init_lock:
+        if _db_initialized:
+            return
+        
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        try:
+            c = conn.cursor()
+            
+            # WAL is persisted in the database header, so this only needs to happen once;
+            # synchronous=NORMAL is per-connection and is re-applied wherever we connect
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA temp_store=MEMORY")
+            c.execute("PRAGMA cache_size=-20000")  # 20MB page cache
+            
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                version = c.execute("PRAGMA user_version").fetchone()[0]
+                if version < SCHEMA_VERSION:
+                    _migrate(c, version)
+                    # PRAGMA does not take bound parameters
+                    c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        
+        _db_initialized = True
+        if version < SCHEMA_VERSION:
+            logger.info(f"Upgraded database schema from version {version} to {SCHEMA_VERSION}")
+        else:
+            logger.info(f"Opened existing database at schema version {version}")
+
+# Initialize database when the server module is loaded; under gunicorn this
+# happens once in the master (preload_app) before the workers are forked
 init_db()
 
 @app.route('/store_data', methods=['POST'])
@@ -61,9 +374,6 @@ def store_data():
         data = request.json
         logger.info(f"Received data: {data}")
         
-        conn = sqlite3.connect('smart_grid.db')
-        c = conn.cursor()
-        
         # Extract zone distribution if it exists
         zone_dist = data.get('zone_distribution', {})
         
@@ -71,16 +381,12 @@ def store_data():
         is_anomaly = 1 if data.get('is_anomaly', False) else 0
         is_peak_hour = 1 if data.get('is_peak_hour', False) else 0
         
-        c.execute('''
-            INSERT INTO power_readings (
-                city, timestamp, voltage, current, power_consumption,
-                temperature, humidity, is_anomaly, is_peak_hour,
-                zone_industrial, zone_residential, zone_commercial,
-                per_capita_consumption, efficiency_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        # Timestamps are stored as epoch milliseconds: compact varints that compare as integers
+        timestamp_ms = int(datetime.fromisoformat(data['timestamp']).timestamp() * 1000)
+        
+        row = (
             data['city'],
-            data['timestamp'],
+            timestamp_ms,
             float(data['voltage']),
             float(data['current']),
             float(data['power_consumption']),
@@ -88,73 +394,94 @@ def store_data():
             float(data.get('humidity', 0)),
             is_anomaly,
             is_peak_hour,
-            zone_dist.get('industrial', 0),
-            zone_dist.get('residential', 0),
-            zone_dist.get('commercial', 0),
+            _pack_zones(
+                zone_dist.get('industrial', 0),
+                zone_dist.get('residential', 0),
+                zone_dist.get('commercial', 0)
+            ),
             float(data.get('per_capita_consumption', 0)),
-            float(data.get('efficiency_score', 0))
-        ))
+            round(float(data.get('efficiency_score', 0)) * EFFICIENCY_SCALE)
+        )
         
-        conn.commit()
-        conn.close()
-        logger.info(f"Successfully stored data for {data['city']}")
+        # Hand the row to the background writer, which commits it with the next batch
+        _ensure_writer_thread()
+        _write_queue.put(row)
+        logger.info(f"Queued data for {data['city']}")
         
-        return jsonify({"status": "success", "message": "Data stored successfully"}), 200
+        return jsonify({"status": "success", "message": "Data accepted for storage"}), 200
     except Exception as e:
         logger.error(f"Error storing data: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/flush', methods=['POST'])
+def flush_data():
+    # Covers this process's write queue only, i.e. all of them with the
+    # default single gunicorn worker (see gunicorn.conf.py)
+    try:
+        flush_writes()
+        return jsonify({"status": "success", "message": "All queued data stored"}), 200
+    except Exception as e:
+        logger.error(f"Error flushing data: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@functools.lru_cache(maxsize=CITY_STATS_CACHE_SIZE)
+def _city_stats_body(city, hours, time_bucket):
+    """Serialized /city_stats response, cached per (city, hours) for one time bucket"""
+    # Get current timestamp and calculate threshold
+    current_time = datetime.now()
+    time_threshold = current_time - timedelta(hours=hours)
+    threshold_ms = int(time_threshold.timestamp() * 1000)
+    
+    logger.info(f"Fetching data for {city} from {time_threshold.isoformat()}")
+    
+    conn = _get_conn()
+    try:
+        c = conn.execute(CITY_STATS_SQL, (city, threshold_ms))
+        rows = c.fetchall()
+    finally:
+        _put_conn(conn)
+    
+    # Build each reading in its final shape straight from the row tuple, indexed
+    # by the column order of CITY_STATS_SQL
+    fromtimestamp = datetime.fromtimestamp
+    readings = [
+        {
+            'id': row[0],
+            'city': row[1],
+            'timestamp': fromtimestamp(row[2] / 1000).isoformat(),
+            'voltage': row[3],
+            'current': row[4],
+            'power_consumption': row[5],
+            'temperature': row[6],
+            'humidity': row[7],
+            'is_anomaly': bool(row[8]),
+            'is_peak_hour': bool(row[9]),
+            'zone_distribution': _unpack_zones(row[10]),
+            'per_capita_consumption': row[11],
+            'efficiency_score': row[12] / EFFICIENCY_SCALE
+        }
+        for row in rows
+    ]
+    
+    # An empty readings array (rather than an error) is returned if no data is found
+    if readings:
+        logger.info(f"Found {len(readings)} readings for {city}")
+    return orjson.dumps({
+        "status": "success",
+        "city": city,
+        "readings": readings
+    })
+
 @app.route('/city_stats/<city>', methods=['GET'])
 def get_city_stats(city):
     try:
         hours = request.args.get('hours', default=24, type=int)
-        conn = sqlite3.connect('smart_grid.db')
-        c = conn.cursor()
-        
-        # Get current timestamp and calculate threshold
-        current_time = datetime.now()
-        time_threshold = (current_time - timedelta(hours=hours)).isoformat()
         
-        logger.info(f"Fetching data for {city} from {time_threshold}")
-        
-        c.execute('''
-            SELECT * FROM power_readings 
-            WHERE city = ? AND timestamp > ?
-            ORDER BY timestamp DESC
-        ''', (city, time_threshold))
-        
-        columns = [description[0] for description in c.description]
-        readings = []
-        
-        for row in c.fetchall():
-            reading = dict(zip(columns, row))
-            # Convert integer boolean fields back to Python booleans
-            reading['is_anomaly'] = bool(reading['is_anomaly'])
-            reading['is_peak_hour'] = bool(reading['is_peak_hour'])
-            # Reconstruct zone_distribution object
-            reading['zone_distribution'] = {
-                'industrial': reading.pop('zone_industrial') or 0,
-                'residential': reading.pop('zone_residential') or 0,
-                'commercial': reading.pop('zone_commercial') or 0
-            }
-            readings.append(reading)
-        
-        conn.close()
-        
-        if not readings:
-            # Return empty readings array instead of error if no data found
-            return jsonify({
-                "status": "success",
-                "city": city,
-                "readings": []
-            }), 200
-            
-        logger.info(f"Found {len(readings)} readings for {city}")
-        return jsonify({
-            "status": "success",
-            "city": city,
-            "readings": readings
-        }), 200
+        # Dashboards poll the same city/window repeatedly; serve those from the
+        # cache until the time bucket rolls over
+        time_bucket = int(time.time() // CITY_STATS_CACHE_TTL)
+        body = _city_stats_body(city, hours, time_bucket)
+        return app.response_class(body, mimetype='application/json'), 200
     except Exception as e:
         logger.error(f"Error fetching city stats: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -165,4 +492,11 @@ def health_check():
 
 if __name__ == '__main__':
     logger.info("Starting Central Server on port 5002...")
-    app.run(host='0.0.0.0', port=5002)
\ No newline at end of file
+    # Serve through gunicorn (settings in gunicorn.conf.py) rather than the Flask dev server
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    os.execvp(sys.executable, [
+        sys.executable, '-m', 'gunicorn',
+        '--config', os.path.join(server_dir, 'gunicorn.conf.py'),
+        '--pythonpath', server_dir,
+        'central_server:app'
+    ])
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Gunicorn settings for the central server
+# Run with: gunicorn -c gunicorn.conf.py central_server:app (or python central_server.py)
+import os
+
+bind = '0.0.0.0:5002'
+
+# A single process with a pool of threads, so a request waiting on SQLite does
+# not hold up the others. The server assumes one process: each worker has its
+# own write queue and writer connection (so writers contend for the database
+# lock), /flush only waits on the queue of the worker that served it, and the
+# /city_stats cache is per worker. Raise WEB_CONCURRENCY only if those limits
+# are acceptable.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = 8
+
+# Import the app (and run init_db) once in the master before forking the workers;
+# connections and the writer thread are created lazily inside each worker
+preload_app = True
@@ -1,8 +1,10 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 import numpy as np
+import numba
 from scipy import stats
 import requests
-import json
+import orjson
 from datetime import datetime, timedelta
 import pandas as pd
 import logging
@@ -10,19 +12,46 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time
 import threading
+import queue
 import random
+import math
+import sched
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+class SmartGridFlask(Flask):
+    json_provider_class = OrjsonProvider
+
+app = SmartGridFlask(__name__)
 
 # Configuration
 CENTRAL_SERVER_URL = "http://localhost:5002"
 WINDOW_SIZE = 10  # Number of readings to consider for moving average
 VOLTAGE_THRESHOLD = (220, 240)  # Acceptable voltage range
 CURRENT_THRESHOLD = (5, 15)     # Acceptable current range
+FORWARD_WORKERS = 8  # Threads posting processed readings to the central server
+FORWARD_QUEUE_SIZE = 1000  # Processed readings waiting to be forwarded
+RECENT_IDS_SIZE = 10000  # Reading ids remembered for de-duplicating retried sends
+
+# Shared generator for the simulator's vectorized draws (PCG64)
+rng = np.random.default_rng()
 
 # Cities configuration with extended parameters
 CITIES = {
@@ -83,6 +112,41 @@ CITIES = {
     }
 }
 
+# Structure-of-arrays view of CITIES for the vectorized simulator; row i of every
+# array belongs to CITY_NAMES[i]
+CITY_NAMES = list(CITIES.keys())
+BASE_LOAD = np.array([c['base_load'] for c in CITIES.values()], dtype=np.float64)
+PEAK_VAR = np.array([c['peak_variation'] for c in CITIES.values()], dtype=np.float64)
+TEMP_MIN = np.array([c['temperature_range'][0] for c in CITIES.values()], dtype=np.float64)
+TEMP_MAX = np.array([c['temperature_range'][1] for c in CITIES.values()], dtype=np.float64)
+HUM_MIN = np.array([c['humidity_range'][0] for c in CITIES.values()], dtype=np.float64)
+HUM_MAX = np.array([c['humidity_range'][1] for c in CITIES.values()], dtype=np.float64)
+POP = np.array([c['population'] for c in CITIES.values()], dtype=np.float64)
+# Columns: industrial, residential, commercial
+ZONES = np.array([
+    [c['industrial_zones'], c['residential_zones'], c['commercial_zones']]
+    for c in CITIES.values()
+], dtype=np.int32)
+# PEAK_MASK[i, hour] is True when hour is one of city i's peak hours
+PEAK_MASK = np.zeros((len(CITIES), 24), dtype=bool)
+for _i, _config in enumerate(CITIES.values()):
+    PEAK_MASK[_i, _config['peak_hours']] = True
+
+# Hour-of-day lookup tables for the simulator, indexed by hour (0-23)
+_HOURS = np.arange(24)
+# Temperature follows a bell curve throughout the day
+# Peak at 2 PM (14:00), lowest at 4 AM (04:00)
+TEMP_CURVE = -np.cos(2 * np.pi * (_HOURS - 4) / 24)
+# Humidity typically inverse to temperature with some lag
+# Peak humidity in early morning, lowest in afternoon
+HUM_CURVE = np.cos(2 * np.pi * (_HOURS - 6) / 24)
+# Time-of-day load multipliers per zone (industrial, residential, commercial)
+ZONE_FACTOR = np.empty((24, 3))
+ZONE_FACTOR[:] = [0.3, 1.2, 0.2]       # Night hours
+ZONE_FACTOR[6:9] = [0.7, 1.4, 0.5]     # Early morning
+ZONE_FACTOR[9:17] = [1.4, 0.6, 1.3]    # Business hours
+ZONE_FACTOR[17:22] = [0.5, 1.5, 0.8]   # Evening hours
+
 # Configure retry strategy
 retry_strategy = Retry(
     total=3,
@@ -93,13 +157,69 @@ http_adapter = HTTPAdapter(max_retries=retry_strategy)
 session = requests.Session()
 session.mount("http://", http_adapter)
 session.mount("https://", http_adapter)
+session.headers.update({'Content-Type': 'application/json'})
+
+class RollingWindow:
+    """Ring buffer of the last `size` power values with running sum and sum of squares"""
+    def __init__(self, size):
+        self.size = size
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+    
+    def push(self, value):
+        """Add a value, overwriting the oldest one once the window is full"""
+        idx = self.count % self.size
+        old = float(self.values[idx])  # 0 while the window is still filling
+        self.values[idx] = value
+        self.count += 1
+        if idx == self.size - 1:
+            # Resync once per lap so floating point drift cannot build up
+            self.total = float(self.values.sum())
+            self.total_sq = float(np.dot(self.values, self.values))
+        else:
+            self.total += value - old
+            self.total_sq += value * value - old * old
+    
+    @property
+    def is_full(self):
+        return self.count >= self.size
+    
+    def mean_std(self):
+        """Mean and population standard deviation of the window"""
+        mean = self.total / self.size
+        variance = max(self.total_sq / self.size - mean * mean, 0.0)
+        return mean, math.sqrt(variance)
+
+class RecentIds:
+    """Thread-safe set of the most recently seen reading ids, oldest evicted first"""
+    def __init__(self, size):
+        self.size = size
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def add(self, reading_id):
+        """Remember an id; False if it was already seen"""
+        with self.lock:
+            if reading_id in self.ids:
+                self.ids.move_to_end(reading_id)
+                return False
+            self.ids[reading_id] = None
+            if len(self.ids) > self.size:
+                self.ids.popitem(last=False)
+            return True
+    
+    def discard(self, reading_id):
+        with self.lock:
+            self.ids.pop(reading_id, None)
 
 class DataPreprocessor:
     def __init__(self):
-        self.readings_buffer = {}
+        self.readings_buffer = {}  # city -> RollingWindow of power_consumption
         
     def clean_data(self, reading):
-        """Clean and validate the incoming reading"""
+        """Clean and validate the incoming reading into the fully typed record forwarded to the central server"""
         try:
             # Extract and convert values to correct types
             voltage = float(reading['voltage'])
@@ -112,25 +232,31 @@ class DataPreprocessor:
             else:
                 timestamp = reading['timestamp']
             
-            # Format the reading with correct types
-            formatted_reading = {
-                'voltage': voltage,
-                'current': current,
-                'power_consumption': power,
-                'city': str(reading['city']),
-                'timestamp': timestamp.isoformat()
-            }
-            
             # Check if values are within acceptable ranges
             is_valid = (
                 VOLTAGE_THRESHOLD[0] <= voltage <= VOLTAGE_THRESHOLD[1] and
                 CURRENT_THRESHOLD[0] <= current <= CURRENT_THRESHOLD[1]
             )
             
-            # Add metadata
-            formatted_reading['status'] = 'valid' if is_valid else 'invalid'
-            formatted_reading['flagged'] = not is_valid
-            formatted_reading['anomaly'] = False  # Default value
+            # Format the reading with correct types, once, including the metadata
+            # and the simulator's weather/zone fields; meters that only report the
+            # electrical values get the same defaults the central server applies
+            formatted_reading = {
+                'city': str(reading['city']),
+                'timestamp': timestamp.isoformat(),
+                'voltage': voltage,
+                'current': current,
+                'power_consumption': power,
+                'status': 'valid' if is_valid else 'invalid',
+                'flagged': not is_valid,
+                'anomaly': False,  # Default value, set by detect_anomalies
+                'temperature': float(reading.get('temperature', 0)),
+                'humidity': float(reading.get('humidity', 0)),
+                'zone_distribution': reading.get('zone_distribution', {}),
+                'is_peak_hour': bool(reading.get('is_peak_hour', False)),
+                'per_capita_consumption': float(reading.get('per_capita_consumption', 0)),
+                'efficiency_score': float(reading.get('efficiency_score', 0))
+            }
             
             logger.info(f"Processed reading from {formatted_reading['city']}: Status={formatted_reading['status']}")
             return formatted_reading
@@ -141,23 +267,18 @@ class DataPreprocessor:
     def detect_anomalies(self, city, reading):
         """Detect anomalies using moving average"""
         try:
-            if city not in self.readings_buffer:
-                self.readings_buffer[city] = []
-            
-            self.readings_buffer[city].append(reading)
+            window = self.readings_buffer.get(city)
+            if window is None:
+                window = self.readings_buffer[city] = RollingWindow(WINDOW_SIZE)
             
-            # Keep only recent readings
-            if len(self.readings_buffer[city]) > WINDOW_SIZE:
-                self.readings_buffer[city].pop(0)
+            current_power = reading['power_consumption']
+            window.push(current_power)
             
             # Calculate moving average if we have enough readings
-            if len(self.readings_buffer[city]) >= WINDOW_SIZE:
-                power_values = [r['power_consumption'] for r in self.readings_buffer[city]]
-                mean_power = np.mean(power_values)
-                std_power = np.std(power_values)
+            if window.is_full:
+                mean_power, std_power = window.mean_std()
                 
                 # Flag if current reading deviates significantly
-                current_power = reading['power_consumption']
                 z_score = abs((current_power - mean_power) / std_power) if std_power > 0 else 0
                 
                 reading['anomaly'] = z_score > 3  # Flag if more than 3 standard deviations
@@ -169,225 +290,233 @@ class DataPreprocessor:
             logger.error(f"Error in detect_anomalies: {str(e)}")
             raise
 
+# Uniform [0, 1) draws _compute_tick takes per city: base power noise, voltage
+# noise, power factor, anomaly test, anomaly direction, base efficiency
+TICK_DRAWS = 6
+
+@numba.njit(cache=True, fastmath=True)
+def _compute_tick(base_load, peak_var, temp, hum, temp_mid, hum_mid, is_peak,
+                  optimal_load, per_capita_divisor, rand_u,
+                  temp_weight, hum_weight, anomaly_probability):
+    """Power, voltage, current, efficiency, per-capita load and anomaly flag for each city"""
+    n = base_load.shape[0]
+    power = np.empty(n)
+    voltage = np.empty(n)
+    current = np.empty(n)
+    efficiency = np.empty(n)
+    per_capita = np.empty(n)
+    is_anomaly = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        u = rand_u[i]
+        
+        # Base power with controlled random variation (±30), plus the full peak
+        # variation when the hour is one of the city's peak hours
+        p = base_load[i] + (u[0] * 60 - 30)
+        if is_peak[i]:
+            p += peak_var[i]
+        
+        # Apply weather impacts with diminishing returns (less impact at extreme values)
+        temp_impact = (temp[i] - temp_mid[i]) * temp_weight
+        p += temp_impact * (1 - abs(temp_impact) / p)
+        humidity_impact = (hum[i] - hum_mid[i]) * hum_weight
+        p += humidity_impact * (1 - abs(humidity_impact) / p)
+        
+        # Voltage is 230V ±5V; current accounts for a realistic 0.95-0.99 power factor
+        v = 230 + (u[1] * 10 - 5)
+        power_factor = 0.95 + u[2] * 0.04
+        c = (p / v) / power_factor
+        
+        # More realistic anomaly: sudden spike or drop (either 50% drop or 100% increase)
+        anomaly = u[3] < anomaly_probability
+        if anomaly:
+            factor = 0.5 if u[4] < 0.5 else 2.0
+            p *= factor
+            c *= factor
+        
+        # Efficiency: base 0.85-0.95, reduced during peak hours, then penalized
+        # for temperature and for being far from the optimal load
+        e = 0.85 + u[5] * 0.1
+        if is_peak[i]:
+            e *= 0.9
+        e *= max(0.7, 1 - abs(temp[i] - temp_mid[i]) / 50)
+        e *= max(0.7, 1 - abs(p / optimal_load[i] - 1) * 0.2)
+        
+        power[i] = p
+        voltage[i] = v
+        current[i] = c
+        efficiency[i] = e
+        # Per capita calculations with population density consideration
+        per_capita[i] = p / per_capita_divisor[i]
+        is_anomaly[i] = anomaly
+    return power, voltage, current, efficiency, per_capita, is_anomaly
+
 class DataSimulator:
     def __init__(self):
         self.running = False
         self.thread = None
+        self.in_flight = {}  # city index -> Future of its last send
         self.anomaly_probability = 0.05
         self.weather_impact = {
             'temperature': 0.4,  # 40% impact on consumption
             'humidity': 0.3      # 30% impact on consumption
         }
-        self.last_readings = {}  # Store last readings for smoother transitions
-    
-    def generate_weather_data(self, city):
-        """Generate realistic weather data for a city"""
-        config = CITIES[city]
-        temp_min, temp_max = config['temperature_range']
-        hum_min, hum_max = config['humidity_range']
-        
-        # Get current hour and create a more realistic daily pattern
-        hour = datetime.now().hour
-        
-        # Temperature follows a bell curve throughout the day
-        # Peak at 2 PM (14:00), lowest at 4 AM (04:00)
-        temp_curve = -np.cos(2 * np.pi * (hour - 4) / 24)
-        base_temp = (temp_max + temp_min) / 2
-        temp_amplitude = (temp_max - temp_min) / 2
-        temperature = base_temp + temp_amplitude * temp_curve
         
-        # Add small random variations while maintaining smooth transitions
-        if city in self.last_readings:
-            last_temp = self.last_readings[city].get('temperature', temperature)
-            # Limit temperature change to 0.5°C per reading
-            temp_change = random.uniform(-0.5, 0.5)
-            temperature = max(min(last_temp + temp_change, temp_max), temp_min)
-        
-        # Humidity typically inverse to temperature with some lag
-        # Peak humidity in early morning, lowest in afternoon
-        hum_curve = np.cos(2 * np.pi * (hour - 6) / 24)
-        base_humidity = (hum_max + hum_min) / 2
-        hum_amplitude = (hum_max - hum_min) / 2
-        humidity = base_humidity + hum_amplitude * hum_curve
-        
-        # Add small random variations while maintaining smooth transitions
-        if city in self.last_readings:
-            last_hum = self.last_readings[city].get('humidity', humidity)
-            # Limit humidity change to 1% per reading
-            hum_change = random.uniform(-1, 1)
-            humidity = max(min(last_hum + hum_change, hum_max), hum_min)
+        # Per-city constants derived from the CITIES arrays
+        self.temp_mid = (TEMP_MIN + TEMP_MAX) / 2
+        self.temp_amplitude = (TEMP_MAX - TEMP_MIN) / 2
+        self.hum_mid = (HUM_MIN + HUM_MAX) / 2
+        self.hum_amplitude = (HUM_MAX - HUM_MIN) / 2
+        self.zone_share = ZONES / ZONES.sum(axis=1, keepdims=True)
+        self.optimal_load = BASE_LOAD + PEAK_VAR
+        population_density = POP / ZONES.sum(axis=1)
+        self.per_capita_divisor = POP * (1 + population_density / 100)
+        
+        # Last weather per city for smoother transitions (NaN until the first reading)
+        self.last_temperature = np.full(len(CITIES), np.nan)
+        self.last_humidity = np.full(len(CITIES), np.nan)
+    
+    def generate_weather_data(self, hour, idx):
+        """Generate realistic weather data for the cities at indexes idx"""
+        # Daily temperature and humidity patterns come from the hourly curves
+        temperature = self.temp_mid[idx] + self.temp_amplitude[idx] * TEMP_CURVE[hour]
+        humidity = self.hum_mid[idx] + self.hum_amplitude[idx] * HUM_CURVE[hour]
+        
+        # Once a city has a previous reading, drift from it instead: limit temperature
+        # change to 0.5°C and humidity change to 1% per reading
+        n = len(idx)
+        last_temperature = self.last_temperature[idx]
+        has_last = ~np.isnan(last_temperature)
+        temperature = np.where(
+            has_last,
+            np.clip(last_temperature + rng.uniform(-0.5, 0.5, n), TEMP_MIN[idx], TEMP_MAX[idx]),
+            temperature
+        )
+        humidity = np.where(
+            has_last,
+            np.clip(self.last_humidity[idx] + rng.uniform(-1, 1, n), HUM_MIN[idx], HUM_MAX[idx]),
+            humidity
+        )
         
         # Store current readings for next iteration
-        self.last_readings[city] = {
-            'temperature': temperature,
-            'humidity': humidity
-        }
+        self.last_temperature[idx] = temperature
+        self.last_humidity[idx] = humidity
         
-        return {
-            'temperature': round(temperature, 1),
-            'humidity': round(humidity, 1)
-        }
+        return np.round(temperature, 1), np.round(humidity, 1)
 
-    def calculate_zone_distribution(self, city, total_power):
-        """Calculate power distribution across different zones"""
-        config = CITIES[city]
-        total_zones = config['industrial_zones'] + config['residential_zones'] + config['commercial_zones']
-        
-        # Base distribution percentages
-        industrial_pct = config['industrial_zones'] / total_zones * 100
-        residential_pct = config['residential_zones'] / total_zones * 100
-        commercial_pct = config['commercial_zones'] / total_zones * 100
-        
-        # Get current hour for time-based variations
-        hour = datetime.now().hour
-        
-        # More realistic time-based variations
-        if 6 <= hour < 9:  # Early morning
-            industrial_pct *= 0.7
-            commercial_pct *= 0.5
-            residential_pct *= 1.4
-        elif 9 <= hour < 17:  # Business hours
-            industrial_pct *= 1.4
-            commercial_pct *= 1.3
-            residential_pct *= 0.6
-        elif 17 <= hour < 22:  # Evening hours
-            industrial_pct *= 0.5
-            commercial_pct *= 0.8
-            residential_pct *= 1.5
-        else:  # Night hours
-            industrial_pct *= 0.3
-            commercial_pct *= 0.2
-            residential_pct *= 1.2
+    def calculate_zone_distribution(self, hour, total_power, idx):
+        """Calculate power distribution across different zones for the cities at indexes idx"""
+        # Base distribution with time-based variations
+        zone_share = self.zone_share[idx] * ZONE_FACTOR[hour]
         
         # Add weather impact on zone distribution
-        weather = self.last_readings.get(city, {})
-        if weather:
-            temp = weather.get('temperature', 25)
-            temp_factor = (temp - sum(config['temperature_range'])/2) / 10
-            industrial_pct *= (1 + temp_factor * 0.2)  # Industrial more affected by heat
-            residential_pct *= (1 - temp_factor * 0.1)  # Residential less affected
+        temp_factor = (self.last_temperature[idx] - self.temp_mid[idx]) / 10
+        zone_share[:, 0] *= 1 + temp_factor * 0.2  # Industrial more affected by heat
+        zone_share[:, 1] *= 1 - temp_factor * 0.1  # Residential less affected
         
-        # Normalize percentages
-        total_pct = industrial_pct + residential_pct + commercial_pct
-        industrial_pct = (industrial_pct / total_pct) * 100
-        residential_pct = (residential_pct / total_pct) * 100
-        commercial_pct = (commercial_pct / total_pct) * 100
+        # Normalize shares
+        zone_share /= zone_share.sum(axis=1, keepdims=True)
         
         # Calculate actual power values with some randomness
-        industrial_power = total_power * (industrial_pct / 100) * random.uniform(0.95, 1.05)
-        residential_power = total_power * (residential_pct / 100) * random.uniform(0.95, 1.05)
-        commercial_power = total_power * (commercial_pct / 100) * random.uniform(0.95, 1.05)
-        
-        return {
-            'industrial': round(industrial_power, 2),
-            'residential': round(residential_power, 2),
-            'commercial': round(commercial_power, 2)
-        }
+        zone_power = total_power[:, None] * zone_share * rng.uniform(0.95, 1.05, zone_share.shape)
+        return np.round(zone_power, 2)
 
-    def generate_reading(self, city):
-        """Generate realistic power consumption data for a city"""
-        config = CITIES[city]
-        current_hour = datetime.now().hour
-        
-        # Generate base power with controlled random variation
-        base_variation = random.uniform(-30, 30)  # Reduced variation for more stability
-        power = config['base_load'] + base_variation
-        
-        # Add peak load during peak hours with smooth transitions
-        if current_hour in config['peak_hours']:
-            # Calculate how close we are to the peak hour
-            time_to_peak = min(abs(current_hour - peak) for peak in config['peak_hours'])
-            peak_factor = 1 - (time_to_peak * 0.1)  # Gradual increase/decrease
-            peak_factor = max(0.7, min(1.0, peak_factor))  # Keep within bounds
-            power += config['peak_variation'] * peak_factor
-        
-        # Generate weather data and apply impact
-        weather = self.generate_weather_data(city)
-        temp_impact = (weather['temperature'] - sum(config['temperature_range'])/2) * self.weather_impact['temperature']
-        humidity_impact = (weather['humidity'] - sum(config['humidity_range'])/2) * self.weather_impact['humidity']
-        
-        # Apply weather impacts with diminishing returns
-        power += temp_impact * (1 - abs(temp_impact)/power)  # Less impact at extreme values
-        power += humidity_impact * (1 - abs(humidity_impact)/power)
-        
-        # Calculate voltage and current with realistic variations
-        base_voltage = 230  # Standard voltage
-        voltage_variation = random.uniform(-5, 5)  # ±5V variation
-        voltage = base_voltage + voltage_variation
-        
-        # Current calculation with power factor consideration
-        power_factor = random.uniform(0.95, 0.99)  # Realistic power factor
-        current = (power / voltage) / power_factor
-        
-        # Determine if this reading is an anomaly
-        is_anomaly = random.random() < self.anomaly_probability
-        if is_anomaly:
-            # More realistic anomaly: sudden spike or drop
-            anomaly_factor = random.choice([0.5, 2.0])  # Either 50% drop or 100% increase
-            power *= anomaly_factor
-            current *= anomaly_factor
+    def generate_readings(self, idx=None):
+        """Generate realistic power consumption data for the cities at indexes idx (default all) in one pass"""
+        if idx is None:
+            idx = np.arange(len(CITY_NAMES))
+        now = datetime.now()
+        current_hour = now.hour
+        n = len(idx)
+        
+        # Generate weather data for the impact calculations below
+        temperature, humidity = self.generate_weather_data(current_hour, idx)
+        is_peak = PEAK_MASK[idx, current_hour]
+        
+        # All of the tick's per-city draws are made up front, so the compiled kernel
+        # only does arithmetic on contiguous arrays
+        power, voltage, current, efficiency, per_capita, is_anomaly = _compute_tick(
+            BASE_LOAD[idx], PEAK_VAR[idx], temperature, humidity,
+            self.temp_mid[idx], self.hum_mid[idx], is_peak,
+            self.optimal_load[idx], self.per_capita_divisor[idx],
+            rng.random((n, TICK_DRAWS)),
+            self.weather_impact['temperature'], self.weather_impact['humidity'],
+            self.anomaly_probability
+        )
         
         # Calculate zone distribution
-        zone_distribution = self.calculate_zone_distribution(city, power)
-        
-        # Calculate efficiency score with multiple factors
-        base_efficiency = random.uniform(0.85, 0.95)  # Base efficiency range
-        
-        # Time-based efficiency
-        if current_hour in config['peak_hours']:
-            base_efficiency *= 0.9  # Reduced efficiency during peak hours
-        
-        # Temperature impact on efficiency
-        temp_efficiency = 1 - abs(weather['temperature'] - sum(config['temperature_range'])/2) / 50
-        base_efficiency *= max(0.7, temp_efficiency)
-        
-        # Load-based efficiency
-        load_factor = power / (config['base_load'] + config['peak_variation'])
-        load_efficiency = 1 - abs(load_factor - 1) * 0.2  # Penalty for being far from optimal load
-        base_efficiency *= max(0.7, load_efficiency)
-        
-        # Per capita calculations with population density consideration
-        population_density = config['population'] / (config['industrial_zones'] + config['residential_zones'] + config['commercial_zones'])
-        per_capita = power / (config['population'] * (1 + population_density/100))
-        
-        reading = {
-            'city': city,
-            'timestamp': datetime.now().isoformat(),
-            'voltage': round(voltage, 2),
-            'current': round(current, 2),
-            'power_consumption': round(power, 2),
-            'temperature': weather['temperature'],
-            'humidity': weather['humidity'],
-            'is_anomaly': is_anomaly,
-            'is_peak_hour': current_hour in config['peak_hours'],
-            'zone_distribution': zone_distribution,
-            'per_capita_consumption': round(per_capita, 2),
-            'efficiency_score': round(base_efficiency, 2)
-        }
+        zone_power = self.calculate_zone_distribution(current_hour, power, idx)
+        
+        timestamp = now.isoformat()
+        readings = [
+            {
+                'city': city,
+                'timestamp': timestamp,
+                'voltage': v,
+                'current': c,
+                'power_consumption': p,
+                'temperature': t,
+                'humidity': h,
+                'is_anomaly': a,
+                'is_peak_hour': peak,
+                'zone_distribution': {'industrial': z[0], 'residential': z[1], 'commercial': z[2]},
+                'per_capita_consumption': pc,
+                'efficiency_score': e
+            }
+            for city, v, c, p, t, h, a, peak, z, pc, e in zip(
+                [CITY_NAMES[i] for i in idx],
+                np.round(voltage, 2).tolist(),
+                np.round(current, 2).tolist(),
+                np.round(power, 2).tolist(),
+                temperature.tolist(),
+                humidity.tolist(),
+                is_anomaly.tolist(),
+                is_peak.tolist(),
+                zone_power.tolist(),
+                np.round(per_capita, 2).tolist(),
+                np.round(efficiency, 2).tolist()
+            )
+        ]
         
-        logger.info(f"Generated reading for {city}: {reading}")
-        return reading
+        for reading in readings:
+            logger.info(f"Generated reading for {reading['city']}: {reading}")
+        return readings
+    
+    def send_reading(self, reading):
+        """Send one reading over the pooled session"""
+        city = reading['city']
+        try:
+            response = session.post('http://localhost:5001/receive_data', data=orjson.dumps(reading), timeout=5)
+            if response.status_code == 200:
+                logger.info(f"Successfully sent reading for {city}")
+            else:
+                logger.warning(f"Failed to send reading for {city}")
+        except Exception as e:
+            logger.error(f"Error sending reading for {city}: {str(e)}")
+    
+    def tick(self, scheduler, executor, i):
+        """Generate and send city i's reading, then schedule its next one"""
+        if not self.running:
+            return
+        # Skip this reading while the city's previous send is still in flight, so
+        # a stalled receiver can't pile up sends in the executor's queue
+        previous = self.in_flight.get(i)
+        if previous is not None and not previous.done():
+            logger.warning(f"Skipping reading for {CITY_NAMES[i]}: previous send still in flight")
+        else:
+            reading = self.generate_readings(np.array([i]))[0]
+            self.in_flight[i] = executor.submit(self.send_reading, reading)
+        # Each city keeps its own random delay between readings (2-4 seconds)
+        scheduler.enter(random.uniform(2, 4), 0, self.tick, (scheduler, executor, i))
     
     def simulate_and_send(self):
         """Continuously generate and send readings for all cities"""
-        while self.running:
-            for city in CITIES.keys():
-                try:
-                    reading = self.generate_reading(city)
-                    response = requests.post(
-                        'http://localhost:5001/receive_data',
-                        json=reading,
-                        headers={'Content-Type': 'application/json'}
-                    )
-                    if response.status_code == 200:
-                        logger.info(f"Successfully sent reading for {city}")
-                    else:
-                        logger.warning(f"Failed to send reading for {city}")
-                except Exception as e:
-                    logger.error(f"Error sending reading for {city}: {str(e)}")
-                
-                # Add random delay between readings (2-4 seconds)
-                time.sleep(random.uniform(2, 4))
+        # The scheduler only generates readings and hands them off, so a slow
+        # send never delays another city's next reading
+        scheduler = sched.scheduler(time.monotonic, time.sleep)
+        with ThreadPoolExecutor(max_workers=len(CITIES)) as executor:
+            for i in range(len(CITY_NAMES)):
+                scheduler.enter(0, 0, self.tick, (scheduler, executor, i))
+            scheduler.run()
     
     def start(self):
         """Start the simulation"""
@@ -406,70 +535,156 @@ class DataSimulator:
 
 preprocessor = DataPreprocessor()
 simulator = DataSimulator()
+recent_ids = RecentIds(RECENT_IDS_SIZE)
+
+# Forwarding queue: receive_data only enqueues the processed reading, and a
+# fixed pool of background threads posts them to the central server (retries
+# included), so a slow or unreachable central server never holds a request thread
+_forward_queue = queue.Queue(maxsize=FORWARD_QUEUE_SIZE)
+_forward_threads = []
+_forward_threads_lock = threading.Lock()
+
+def forward_reading(reading):
+    """Post a processed reading to the central server with retry logic; True once stored"""
+    max_retries = 3
+    retry_delay = 1  # seconds
+    
+    for attempt in range(max_retries):
+        try:
+            response = session.post(
+                f"{CENTRAL_SERVER_URL}/store_data",
+                data=orjson.dumps(reading),
+                timeout=5
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Successfully forwarded data from {reading['city']}")
+                return True
+            error_msg = response.json().get('message', 'Unknown error')
+            logger.warning(f"Attempt {attempt + 1} failed. Status code: {response.status_code}, Error: {error_msg}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Attempt {attempt + 1} failed with network error: {str(e)}")
+        
+        if attempt < max_retries - 1:
+            time.sleep(retry_delay * (2 ** attempt))  # Exponential backoff
+    
+    logger.error(f"Dropping reading from {reading['city']} after {max_retries} attempts")
+    return False
+
+def _forward_loop():
+    while True:
+        reading_id, reading = _forward_queue.get()
+        forwarded = False
+        try:
+            forwarded = forward_reading(reading)
+        except Exception as e:
+            logger.error(f"Unexpected error forwarding reading: {str(e)}")
+        finally:
+            # The reading was dropped, so a resend of its id must be accepted again
+            if not forwarded and reading_id is not None:
+                recent_ids.discard(reading_id)
+            _forward_queue.task_done()
+
+def _ensure_forward_threads():
+    """Start the forwarding threads on first use"""
+    if not _forward_threads:
+        with _forward_threads_lock:
+            if not _forward_threads:
+                for i in range(FORWARD_WORKERS):
+                    thread = threading.Thread(target=_forward_loop, name=f'forwarder-{i}', daemon=True)
+                    thread.start()
+                    _forward_threads.append(thread)
+
+def accept_reading(reading):
+    """Clean a raw reading, score it for anomalies and queue it for forwarding
+
+    Returns False, without processing it, for a reading whose client-generated
+    'id' was already accepted (a retried send). Raises queue.Full when the
+    forwarding threads are not keeping up.
+    """
+    reading_id = reading.get('id')
+    if reading_id is not None and not recent_ids.add(reading_id):
+        return False
+    
+    try:
+        # Clean and preprocess the data; clean_data already returns every field
+        # the central server needs, with the right types
+        processed_reading = preprocessor.clean_data(reading)
+        
+        # Detect anomalies
+        processed_reading = preprocessor.detect_anomalies(processed_reading['city'], processed_reading)
+        
+        # Hand the reading to the forwarding threads
+        _ensure_forward_threads()
+        _forward_queue.put_nowait((reading_id, processed_reading))
+    except Exception:
+        # Not accepted, so a retry of this id must be processed again
+        if reading_id is not None:
+            recent_ids.discard(reading_id)
+        raise
+    return True
 
 @app.route('/receive_data', methods=['POST'])
 def receive_data():
     try:
         # Get the reading from the request
-        reading = request.json
+        reading = request.get_json(cache=True)
         logger.info(f"Received reading from {reading['city']}")
         
-        # Clean and preprocess the data
-        cleaned_reading = preprocessor.clean_data(reading)
-        
-        # Detect anomalies
-        processed_reading = preprocessor.detect_anomalies(reading['city'], cleaned_reading)
-        
-        # Ensure all required fields are present and properly typed
-        required_fields = {
-            'city': str(processed_reading['city']),
-            'timestamp': processed_reading['timestamp'],
-            'voltage': float(processed_reading['voltage']),
-            'current': float(processed_reading['current']),
-            'power_consumption': float(processed_reading['power_consumption']),
-            'status': str(processed_reading['status']),
-            'flagged': bool(processed_reading['flagged']),
-            'anomaly': bool(processed_reading['anomaly']),
-            'temperature': float(reading['temperature']),
-            'humidity': float(reading['humidity']),
-            'zone_distribution': reading['zone_distribution'],
-            'is_peak_hour': bool(reading['is_peak_hour']),
-            'per_capita_consumption': float(reading['per_capita_consumption']),
-            'efficiency_score': float(reading['efficiency_score'])
-        }
-        
-        # Forward to central server with retry logic
-        max_retries = 3
-        retry_delay = 1  # seconds
+        # A full queue means the central server is not keeping up, so push back on the sender
+        try:
+            if not accept_reading(reading):
+                return jsonify({"status": "success", "message": "Duplicate reading ignored"})
+        except queue.Full:
+            logger.warning(f"Forwarding queue full, rejecting reading from {reading['city']}")
+            return jsonify({"status": "error", "message": "Forwarding queue is full"}), 503
         
-        for attempt in range(max_retries):
+        return jsonify({"status": "success", "message": "Data processed and queued for forwarding"})
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/receive_batch', methods=['POST'])
+def receive_batch():
+    """Accept several readings in one request: {"readings": [reading, ...]}"""
+    try:
+        readings = request.get_json(cache=True)['readings']
+        logger.info(f"Received batch of {len(readings)} readings")
+        
+        # Invalid readings are skipped and counted rather than failing the whole
+        # batch; duplicates of already accepted readings count as accepted
+        accepted = 0
+        duplicates = 0
+        for reading in readings:
             try:
-                response = session.post(
-                    f"{CENTRAL_SERVER_URL}/store_data",
-                    json=required_fields,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=5
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Successfully forwarded data from {reading['city']}")
-                    return jsonify({"status": "success", "message": "Data processed and forwarded"})
-                else:
-                    error_msg = response.json().get('message', 'Unknown error')
-                    logger.warning(f"Attempt {attempt + 1} failed. Status code: {response.status_code}, Error: {error_msg}")
-                    
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (2 ** attempt))  # Exponential backoff
-                    else:
-                        return jsonify({"status": "error", "message": f"Failed to forward data after {max_retries} attempts: {error_msg}"}), 500
-                        
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Attempt {attempt + 1} failed with network error: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (2 ** attempt))
-                else:
-                    return jsonify({"status": "error", "message": "Network error after multiple retries"}), 500
-                    
+                if not accept_reading(reading):
+                    duplicates += 1
+                accepted += 1
+            except queue.Full:
+                logger.warning(f"Forwarding queue full, rejecting {len(readings) - accepted} readings")
+                return jsonify({"status": "error", "message": "Forwarding queue is full", "accepted": accepted}), 503
+            except Exception as e:
+                logger.error(f"Error processing reading in batch: {str(e)}")
+        
+        # Any rejected reading fails the request, so the sender cannot mistake a
+        # partly invalid batch for a delivered one; the counts say which part made it
+        rejected = len(readings) - accepted
+        if rejected:
+            return jsonify({
+                "status": "error",
+                "message": f"{rejected} of {len(readings)} readings rejected",
+                "accepted": accepted,
+                "duplicates": duplicates,
+                "rejected": rejected
+            }), 422
+        
+        return jsonify({
+            "status": "success",
+            "message": "Data processed and queued for forwarding",
+            "accepted": accepted,
+            "duplicates": duplicates,
+            "rejected": 0
+        })
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -1,28 +1,79 @@
 import random
 import time
-import json
+import math
+import asyncio
+import uuid
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
-import requests
+import aiohttp
+import orjson
+from yarl import URL
 import numpy as np
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configure retry strategy
-retry_strategy = Retry(
-    total=3,  # number of retries
-    backoff_factor=1,  # wait 1, 2, 4 seconds between retries
-    status_forcelist=[500, 502, 503, 504]  # HTTP status codes to retry on
-)
+# Edge server endpoints, relative to the session's base_url; parsed once here
+# rather than from a string on every request
+HEALTH_PATH = URL('/health')
+RECEIVE_BATCH_PATH = URL('/receive_batch')
 
-# Create a session with the retry strategy
-session = requests.Session()
-session.mount("http://", HTTPAdapter(max_retries=retry_strategy))
+# Bulkhead limits on requests in flight
+GLOBAL_IN_FLIGHT = 16  # Across all cities
+CITY_IN_FLIGHT = 2     # Per city
+
+# Keep-alive connection pool shared by every city. The per-host limit matches
+# GLOBAL_IN_FLIGHT, so every request the bulkhead lets through has a connection
+# ready and no time spent waiting for one ends up in the latency samples
+POOL_LIMIT = 32                         # Max open connections in total
+POOL_LIMIT_PER_HOST = GLOBAL_IN_FLIGHT  # Max open connections to the edge server
+KEEPALIVE_TIMEOUT = 30                  # Seconds an idle connection is kept for reuse
+
+# Exponential backoff after failed sends
+BACKOFF_BASE_DELAY = 1.0  # Seconds to wait after the first failure
+BACKOFF_MAX_DELAY = 30.0  # Cap on the doubling delay
+BACKOFF_JITTER = 0.5      # Up to +50% random spread so cities do not retry in step
+
+# Circuit breaker around the edge server
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit
+BREAKER_RESET_TIMEOUT = 20     # Seconds the circuit stays open before a probe
+
+# Readings are sent to the edge server in batches
+BATCH_SIZE = 10        # Readings that trigger a send
+FLUSH_INTERVAL = 10.0  # Max seconds a reading waits in the buffer
+MAX_BUFFERED = 100     # Readings kept for resending after failures; oldest dropped first
+
+# Request timeouts follow the edge server's observed latency
+DEFAULT_TIMEOUT = 5.0     # Seconds, until enough responses have been timed
+LATENCY_SAMPLES = 200     # Recent response times kept
+MIN_LATENCY_SAMPLES = 20  # Responses needed before the timeout adapts
+TIMEOUT_P95_FACTOR = 1.5  # Timeout as a multiple of p95 latency
+TIMEOUT_BOUNDS = (0.25, 2.0)  # Min and max adaptive timeout in seconds
+
+# Meter values are drawn this many readings at a time
+READING_BATCH = 1024
+
+# Successful sends are logged once per this many batches (across all cities);
+# warnings and errors are always logged
+SUCCESS_LOG_EVERY = 50
+
+@dataclass(slots=True)
+class Reading:
+    """One smart meter reading; orjson serializes it with these field names
+
+    `id` is unique per reading and stays the same when the reading is resent,
+    so the edge server can drop duplicates and retries are safe.
+    """
+    id: str
+    city: str
+    timestamp: str
+    voltage: float
+    current: float
+    power_consumption: float
 
 class SmartMeter:
     def __init__(self, city):
@@ -30,89 +81,294 @@ class SmartMeter:
         self.base_voltage = 230  # Standard voltage in India
         self.base_current = 10   # Base current in amperes
         self.base_power = self.base_voltage * self.base_current
-        logger.info(f"Initialized smart meter for {city}")
+        self.rng = np.random.default_rng()
+        self.next_index = READING_BATCH  # Forces a refill on the first reading
+        logger.info("Initialized smart meter for %s", city)
+    
+    def refill(self):
+        """Draw the next READING_BATCH meter values in one vectorized pass"""
+        # Generate random variations
+        voltage = self.base_voltage + self.rng.uniform(-5, 5, READING_BATCH)
+        current = self.base_current + self.rng.uniform(-2, 2, READING_BATCH)
+        power = voltage * current
+        
+        # Rounded and converted to Python floats once for the whole batch
+        self.voltages = np.round(voltage, 2).tolist()
+        self.currents = np.round(current, 2).tolist()
+        self.powers = np.round(power, 2).tolist()
+        self.next_index = 0
         
     def generate_reading(self):
         try:
-            # Generate random variations
-            voltage_variation = random.uniform(-5, 5)
-            current_variation = random.uniform(-2, 2)
-            
-            # Calculate readings with some randomness
-            voltage = self.base_voltage + voltage_variation
-            current = self.base_current + current_variation
-            power = voltage * current
+            if self.next_index >= READING_BATCH:
+                self.refill()
+            i = self.next_index
+            self.next_index += 1
             
             # Create reading data
-            reading = {
-                'city': self.city,
-                'timestamp': datetime.now().isoformat(),
-                'voltage': round(voltage, 2),
-                'current': round(current, 2),
-                'power_consumption': round(power, 2)
-            }
+            reading = Reading(
+                id=uuid.uuid4().hex,
+                city=self.city,
+                timestamp=datetime.now().isoformat(),
+                voltage=self.voltages[i],
+                current=self.currents[i],
+                power_consumption=self.powers[i]
+            )
             
             return reading
         except Exception as e:
-            logger.error(f"Error generating reading for {self.city}: {str(e)}")
+            logger.error("Error generating reading for %s: %s", self.city, e)
             return None
 
-def check_edge_server(edge_server_url):
-    """Check if edge server is available"""
+async def check_edge_server(session, timeout):
+    """Check if edge server is available; a timeout is raised, not reported as False"""
     try:
-        response = session.get(f"{edge_server_url}/health", timeout=5)
-        return response.status_code == 200
-    except:
+        async with session.get(HEALTH_PATH, timeout=timeout) as response:
+            return response.status == 200
+    except asyncio.TimeoutError:
+        raise
+    except Exception:
+        return False
+
+class CircuitBreaker:
+    """Stops calls to a failing service for a cooldown, then lets one probe through
+
+    closed: calls go through; `failure_threshold` consecutive failures open it.
+    open: calls are refused until `reset_timeout` seconds have passed.
+    half_open: one probe call is allowed; success closes the circuit, failure reopens it.
+    """
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+    
+    def allow(self):
+        """Whether a call may be made now"""
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            return True
         return False
+    
+    def on_success(self):
+        self.state = 'closed'
+        self.failures = 0
+    
+    def on_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            logger.error("Circuit open for %s. Pausing sends for %s seconds...", self.name, self.reset_timeout)
+
+class LatencyTracker:
+    """Recent response times, used to set request timeouts slightly above p95"""
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+    
+    def record(self, seconds):
+        self.samples.append(seconds)
+    
+    def timeout(self):
+        """Seconds to allow the next request"""
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_TIMEOUT
+        ordered = sorted(self.samples)
+        p95 = ordered[math.ceil(0.95 * len(ordered)) - 1]
+        return max(TIMEOUT_BOUNDS[0], min(TIMEOUT_BOUNDS[1], p95 * TIMEOUT_P95_FACTOR))
+
+# Shared by every city, since they all talk to the same edge server
+latency = LatencyTracker()
 
-def simulate_city_data(city, edge_server_url):
+# Batches and readings delivered so far, for the sampled success log
+sent_batches = 0
+sent_readings = 0
+
+def backoff_delay(attempt):
+    """Seconds to wait before retry number `attempt` (0-based), with jitter"""
+    delay = min(BACKOFF_MAX_DELAY, BACKOFF_BASE_DELAY * 2 ** attempt)
+    return delay * (1 + random.uniform(0, BACKOFF_JITTER))
+
+async def send_batch(city, session, batch, global_slots, city_slots):
+    """Health-check the edge server and POST one batch of readings
+
+    Returns 'sent' when every reading was accepted, 'rejected' when the edge
+    server answered but rejected some readings as invalid (422), and 'failed'
+    when the batch did not get through and should be sent again.
+    """
+    global sent_batches, sent_readings
+    # The health check gets the fixed default timeout, so a slowed-down edge
+    # server still answers it and its response time can raise the estimate;
+    # the send itself uses the adaptive timeout
+    timeout_seconds = DEFAULT_TIMEOUT
+    try:
+        # Bulkhead: a city waits for one of its own slots and one of the global
+        # ones, so a stalled city cannot take over the shared connection pool
+        async with global_slots, city_slots:
+            # Check edge server health before sending data
+            started = time.monotonic()
+            if not await check_edge_server(session, aiohttp.ClientTimeout(total=timeout_seconds)):
+                logger.error("Edge server not responding to %s", city)
+                return 'failed'
+            latency.record(time.monotonic() - started)
+            timeout_seconds = latency.timeout()
+            timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+            
+            # Send to edge server, encoded with orjson; the payload carries its
+            # own Content-Type, as json= would
+            body = aiohttp.BytesPayload(
+                orjson.dumps({'readings': batch}),
+                content_type='application/json'
+            )
+            started = time.monotonic()
+            async with session.post(
+                RECEIVE_BATCH_PATH,
+                data=body,
+                timeout=timeout
+            ) as response:
+                latency.record(time.monotonic() - started)
+                if response.status == 200:
+                    sent_batches += 1
+                    sent_readings += len(batch)
+                    # Only every SUCCESS_LOG_EVERY-th success is logged, and
+                    # formatting the batch is skipped entirely unless INFO is enabled
+                    if sent_batches % SUCCESS_LOG_EVERY == 0 and logger.isEnabledFor(logging.INFO):
+                        logger.info(
+                            "Sent %d batches (%d readings) so far; latest %d readings from %s: %s",
+                            sent_batches, sent_readings, len(batch), city, batch
+                        )
+                    return 'sent'
+                if response.status == 422:
+                    result = await response.json(loads=orjson.loads)
+                    logger.error(
+                        "Edge server rejected %d of %d readings from %s as invalid",
+                        result['rejected'], len(batch), city
+                    )
+                    return 'rejected'
+                logger.warning("Failed to send readings from %s. Status code: %s", city, response.status)
+                return 'failed'
+        
+    except Exception as e:
+        # Every failure is handled the same way; only the log line differs
+        if isinstance(e, asyncio.TimeoutError):
+            # Count the timeout (of the health check or the send, whichever was
+            # running) as a response that took at least this long, or the p95
+            # would only ever see the fast requests and never grow
+            latency.record(timeout_seconds)
+            logger.error("Timed out after %.2f seconds sending readings from %s", timeout_seconds, city)
+        else:
+            kind = "Network" if isinstance(e, aiohttp.ClientError) else "Unexpected"
+            logger.error("%s error for %s: %s", kind, city, e)
+    return 'failed'
+
+async def simulate_city_data(city, session, global_slots):
     meter = SmartMeter(city)
+    breaker = CircuitBreaker(city)
+    city_slots = asyncio.Semaphore(CITY_IN_FLIGHT)
     consecutive_failures = 0
-    max_consecutive_failures = 5
+    buffer = []  # Readings waiting for the next batch
+    last_flush = time.monotonic()
+    retry_at = 0.0  # No flush before this time while backing off
+    pending = {}  # send_batch task still in flight -> the batch it is sending
+    holding = False  # Readings are being held while the circuit is open
+    
+    def record(task):
+        """Update the breaker and backoff with the outcome of a finished send"""
+        nonlocal consecutive_failures, retry_at, buffer
+        batch = pending.pop(task)
+        outcome = task.result()
+        if outcome != 'failed':
+            # The edge server answered, so this counts as a success for the breaker
+            # and backoff even if it rejected readings; those are invalid and would
+            # only be rejected again, so they are not resent
+            consecutive_failures = 0  # Reset failure counter
+            breaker.on_success()
+            return
+        
+        # Put the readings back to be resent with the next batch; their ids let
+        # the edge server ignore any it already accepted
+        buffer = (batch + buffer)[-MAX_BUFFERED:]
+        consecutive_failures += 1
+        breaker.on_failure()
+        # Back off exponentially while sends keep failing; once the circuit
+        # opens, the breaker decides when to try again
+        if breaker.state != 'open':
+            delay = backoff_delay(consecutive_failures - 1)
+            logger.warning("%d consecutive failures for %s. Retrying in %.1f seconds...", consecutive_failures, city, delay)
+            retry_at = time.monotonic() + delay
     
     while True:
-        try:
-            # Check edge server health before sending data
-            if not check_edge_server(edge_server_url):
-                logger.error(f"Edge server not responding. Waiting before retry...")
-                time.sleep(5)
-                continue
-
-            # Generate reading
-            reading = meter.generate_reading()
-            if not reading:
-                continue
+        # The 1-5 second interval is measured from the start of this iteration,
+        # so time spent sending does not stretch the cadence
+        next_deadline = time.monotonic() + random.uniform(1, 5)
+        
+        # Pick up sends that finished since the last iteration
+        for task in [task for task in pending if task.done()]:
+            record(task)
+        
+        # Generate reading
+        reading = meter.generate_reading()
+        if reading:
+            buffer.append(reading)
+        
+        # Send the buffer as one batch once it is full or has waited long enough
+        now = time.monotonic()
+        if buffer and now >= retry_at and (
+            len(buffer) >= BATCH_SIZE or now - last_flush >= FLUSH_INTERVAL
+        ):
+            last_flush = now
             
-            # Send to edge server
-            response = session.post(
-                f"{edge_server_url}/receive_data",
-                json=reading,
-                headers={'Content-Type': 'application/json'},
-                timeout=5
-            )
+            # Keep up to CITY_IN_FLIGHT sends going at once; when the window is
+            # full, wait for one to finish first, so the breaker below already
+            # reflects its outcome
+            if len(pending) >= CITY_IN_FLIGHT:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record(task)
             
-            if response.status_code == 200:
-                logger.info(f"Successfully sent reading from {city}: {reading}")
-                consecutive_failures = 0  # Reset failure counter
+            # While the circuit is open, skip the edge server entirely until it
+            # is time for a probe; the readings stay buffered until then
+            if not breaker.allow():
+                buffer = buffer[-MAX_BUFFERED:]
+                # Logged once per open period rather than on every reading
+                if not holding:
+                    logger.warning(
+                        "Circuit open for %s. Holding readings (up to %d) until the next probe",
+                        city, MAX_BUFFERED
+                    )
+                    holding = True
             else:
-                logger.warning(f"Failed to send reading from {city}. Status code: {response.status_code}")
-                consecutive_failures += 1
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Network error for {city}: {str(e)}")
-            consecutive_failures += 1
-        except Exception as e:
-            logger.error(f"Unexpected error for {city}: {str(e)}")
-            consecutive_failures += 1
+                holding = False
+                batch, buffer = buffer, []
+                task = asyncio.create_task(send_batch(city, session, batch, global_slots, city_slots))
+                pending[task] = batch
         
-        # If too many consecutive failures, wait longer
-        if consecutive_failures >= max_consecutive_failures:
-            logger.error(f"Too many consecutive failures for {city}. Waiting 30 seconds before retry...")
-            time.sleep(30)
-            consecutive_failures = 0
-        else:
-            # Random delay between 1-5 seconds
-            time.sleep(random.uniform(1, 5))
+        # Wait out whatever is left of the interval; sends carry on meanwhile
+        await asyncio.sleep(max(0.0, next_deadline - time.monotonic()))
+
+async def main(cities, edge_server_url):
+    # One session for every city, so they all share its connection pool; idle
+    # connections stay open between readings instead of reconnecting each time.
+    # Requests use paths relative to the session's base_url (the edge server)
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    async with aiohttp.ClientSession(
+        base_url=edge_server_url,
+        connector=connector,
+        timeout=timeout
+    ) as session:
+        global_slots = asyncio.Semaphore(GLOBAL_IN_FLIGHT)
+        await asyncio.gather(*[
+            simulate_city_data(city, session, global_slots) for city in cities
+        ])
 
 if __name__ == "__main__":
     # List of cities to simulate
@@ -120,8 +376,7 @@ if __name__ == "__main__":
     edge_server_url = "http://localhost:5001"
     
     logger.info("Starting Smart Grid IoT Simulator...")
-    logger.info(f"Edge Server URL: {edge_server_url}")
+    logger.info("Edge Server URL: %s", edge_server_url)
     
-    # Start simulation for each city
-    for city in cities:
-        simulate_city_data(city, edge_server_url)
\ No newline at end of file
+    # Simulate every city concurrently on one event loop
+    asyncio.run(main(cities, edge_server_url))
\ No newline at end of file